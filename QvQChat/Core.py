@@ -8,8 +8,13 @@ QvQChat 主模块
 """
 
 import asyncio
+import base64
+import json
+import os
 import random
+import re
 import time
+from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 from ErisPulse import sdk
@@ -94,6 +99,9 @@ class Main(BaseModule):
         # AI 启用状态
         self._ai_disabled: Dict[str, bool] = {}
 
+        # 已注册群组的内存缓存：避免每条群消息都回源存储检查注册状态
+        self._known_groups: set = set(self.config.list_all_groups())
+
         # 运行统计
         self._stats = {
             "total_messages": 0,
@@ -254,12 +262,15 @@ class Main(BaseModule):
             if group_id:
                 self.session.update_group_silence(user_id, group_id)
                 # 确保群组被注册（Dashboard 可见）
-                if group_id not in self.config.list_all_groups():
-                    group_cfg = self.config.get_group_config(group_id)
-                    if group_name:
-                        group_cfg["group_name"] = group_name
-                    self.config.set_group_config(group_id, group_cfg)
-                    self.logger.info(f"发现新群组: {group_name or group_id}")
+                # 已知群组走内存集合短路，未命中时再回源存储确认（可能被Dashboard注册）
+                if group_id not in self._known_groups:
+                    if group_id not in self.config.list_all_groups():
+                        group_cfg = self.config.get_group_config(group_id)
+                        if group_name:
+                            group_cfg["group_name"] = group_name
+                        self.config.set_group_config(group_id, group_cfg)
+                        self.logger.info(f"发现新群组: {group_name or group_id}")
+                    self._known_groups.add(group_id)
 
             # 判断是否回复
             should_reply = await self._check_should_reply(
@@ -392,8 +403,6 @@ class Main(BaseModule):
         # 夜间模式：夜间自动开启窥屏
         night_cfg = self.config.get("stalker_mode.night_mode", {})
         if night_cfg.get("enabled", True):
-            from datetime import datetime
-
             hour = datetime.now().hour
             begin = night_cfg.get("begin", 23)
             end = night_cfg.get("end", 7)
@@ -651,8 +660,6 @@ class Main(BaseModule):
             for marker in self._SKIP_MARKERS:
                 if marker in stripped:
                     return True
-        import re
-
         for pattern in self._SKIP_REGEX:
             if re.search(pattern, stripped):
                 return True
@@ -800,8 +807,6 @@ class Main(BaseModule):
 
     async def _handle_tool_calls(self, message, data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """处理 AI 返回的 MCP 工具调用，返回 tool result 消息列表"""
-        import json
-
         tool_calls = getattr(message, "tool_calls", None) or []
         results = []
         for tc in tool_calls:
@@ -834,13 +839,13 @@ class Main(BaseModule):
         name = name.strip().lower()
         if not name:
             return None
-        # 精确匹配
-        for s in self.sticker_manager.list_stickers():
-            if s.get("name", "").lower() == name:
-                return s
+        name_index = self.sticker_manager.get_name_index()
+        # 精确匹配（归一化索引，O(1)）
+        sticker = name_index.get(name)
+        if sticker:
+            return sticker
         # 包含匹配（双向：AI名在贴纸名中，或贴纸名在AI名中）
-        for s in self.sticker_manager.list_stickers():
-            sname = s.get("name", "").lower()
+        for sname, s in name_index.items():
             if name in sname or sname in name:
                 return s
             if name in s.get("description", "").lower():
@@ -848,8 +853,8 @@ class Main(BaseModule):
         # 截断模糊（AI可能多写或少写一个字）
         if len(name) > 2:
             shortened = name[:-1]
-            for s in self.sticker_manager.list_stickers():
-                if shortened in s.get("name", "").lower():
+            for sname, s in name_index.items():
+                if shortened in sname:
                     return s
         return None
 
@@ -859,7 +864,7 @@ class Main(BaseModule):
         统一转为 bytes 发送（避免跨容器路径不通的问题）：
         - HTTP(S) URL：下载为 bytes
         - 本地文件路径：读取为 bytes
-        - base64:// 前缀：直接透传（适配器已支持）
+        - base64:// 前缀：本地解码为 bytes（免去适配器侧再解码）
         """
         detail_type = data.get("detail_type", "private")
         target_type = "group" if detail_type == "group" else "user"
@@ -879,8 +884,9 @@ class Main(BaseModule):
 
         try:
             if image_path.startswith("base64://"):
-                # 已是适配器格式，直接透传
-                await adapter.Send.To(target_type, target_id).Image(image_path)
+                # 本地解码为 bytes，走统一的二进制发送路径
+                img_bytes = base64.b64decode(image_path[9:])
+                await adapter.Send.To(target_type, target_id).Image(img_bytes)
             elif image_path.startswith(("http://", "https://")):
                 # HTTP URL → 下载为 bytes
                 resp = await self.sdk.client.get(image_path, timeout=30)
@@ -889,7 +895,6 @@ class Main(BaseModule):
                 await adapter.Send.To(target_type, target_id).Image(img_bytes)
             else:
                 # 本地文件路径 → 读取为 bytes（不依赖适配器读文件）
-                import os
                 if not os.path.exists(image_path):
                     self.logger.warning(f"图片文件不存在: {image_path}")
                     return
@@ -1064,8 +1069,6 @@ class Main(BaseModule):
     @staticmethod
     def _get_time_description() -> str:
         """获取当前时段描述"""
-        from datetime import datetime
-
         hour = datetime.now().hour
         if 5 <= hour < 8:
             return "清晨，你刚醒还有点迷糊"
@@ -1279,7 +1282,6 @@ class Main(BaseModule):
                 return
 
             # 解析文本中的表情包内嵌标签（统一正则，一次性匹配所有格式）
-            import re
             # 格式1: <|sticker|名称</sticker|>  标准
             # 格式2: <send_sticker><parameter...>名称</parameter></send_sticker>  兼容function calling
             # 格式3: <send_sticker>名称</send_sticker>  兼容
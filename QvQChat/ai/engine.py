@@ -37,6 +37,13 @@ class AIEngine:
         self.behavior_manager = behavior_manager
         self.logger = logger.get_child("AIEngine")
         self._clients: Dict[str, AIClient] = {}  # model_id -> client
+        self._http_client = None  # 共享的httpx客户端（懒创建）
+
+    def _get_http_client(self):
+        """获取共享的httpx客户端（懒创建，复用连接池避免每次下载重建）"""
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(timeout=15.0)
+        return self._http_client
 
     def _get_client(self, model_config: Dict[str, Any]) -> AIClient:
         """获取或创建模型客户端（带缓存）"""
@@ -216,9 +223,8 @@ class AIEngine:
         # HTTP(S) 远程 URL
         if url.startswith(("http://", "https://")) and httpx is not None:
             try:
-                async with httpx.AsyncClient(timeout=15.0) as client:
-                    resp = await client.get(url)
-                    resp.raise_for_status()
+                resp = await self._get_http_client().get(url)
+                resp.raise_for_status()
                 mime = resp.headers.get("content-type", "image/png")
                 mime = mime.split(";")[0].strip()
                 b64 = base64.b64encode(resp.content).decode()
@@ -1,9 +1,24 @@
+import asyncio
 import json
+import time
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 from ErisPulse import sdk
 
+# isoformat时间戳按秒缓存：一次写路径会取多次时间戳（条目+last_updated等），
+# 记忆时间戳仅用于展示/排序，秒级精度足够
+_now_cache = (0, "")
+
+
+def _now_iso() -> str:
+    """获取当前ISO时间戳（同一秒内复用，避免重复格式化）"""
+    global _now_cache
+    second = int(time.time())
+    if second != _now_cache[0]:
+        _now_cache = (second, datetime.now().isoformat())
+    return _now_cache[1]
+
 
 class QvQMemory:
     """
@@ -20,8 +35,58 @@ class QvQMemory:
         self.logger = sdk.logger.get_child("QvQMemory")
         self.storage = sdk.storage
         self.ai_manager = ai_manager
+        # 记忆读缓存：key -> {"data": memory, "timestamp": ...}
+        # 同一会话连续消息在TTL窗口内只回源存储一次，写入时直接刷新缓存
         self._memory_cache = {}
+        self._MEMORY_CACHE_TTL = 60
         self._last_cleanup = {}
+        # 会话历史写合并（write-behind）：热数据留在内存，
+        # 后台任务定期把脏会话批量落盘，避免每条消息一次存储写
+        self._session_cache: Dict[str, List[Dict[str, str]]] = {}
+        self._dirty_sessions: set = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._SESSION_FLUSH_INTERVAL = 5
+
+    def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        从读缓存获取记忆（过期则失效）
+
+        Args:
+            key: 存储键
+
+        Returns:
+            Optional[Dict[str, Any]]: 缓存的记忆字典，未命中返回None
+        """
+        cached = self._memory_cache.get(key)
+        if not cached:
+            return None
+        if time.time() - cached["timestamp"] >= self._MEMORY_CACHE_TTL:
+            del self._memory_cache[key]
+            return None
+        return cached["data"]
+
+    def _cache_put(self, key: str, memory: Dict[str, Any]) -> None:
+        """
+        写入读缓存
+
+        Args:
+            key: 存储键
+            memory: 记忆字典
+        """
+        self._memory_cache[key] = {"data": memory, "timestamp": time.time()}
+
+    def invalidate_cache(self, key: Optional[str] = None) -> None:
+        """
+        失效记忆读缓存（绕过本类直接写存储后必须调用，否则TTL窗口内
+        读到的旧记忆可能被后续写回覆盖刚写入的数据）
+
+        Args:
+            key: 存储键（不传则清空全部缓存）
+        """
+        if key is None:
+            self._memory_cache.clear()
+        else:
+            self._memory_cache.pop(key, None)
 
     def _get_user_memory_key(self, user_id: str) -> str:
         """
@@ -71,6 +136,45 @@ class QvQMemory:
         """
         return f"qvc:session:{chat_id}"
 
+    def _get_session(self, session_key: str) -> List[Dict[str, str]]:
+        """
+        获取会话列表（优先内存缓存，未命中回源存储）
+
+        Args:
+            session_key: 会话存储键
+
+        Returns:
+            List[Dict[str, str]]: 会话消息列表
+        """
+        session = self._session_cache.get(session_key)
+        if session is None:
+            session = self.storage.get(session_key, [])
+            self._session_cache[session_key] = session
+        return session
+
+    def _mark_session_dirty(self, session_key: str) -> None:
+        """标记会话待落盘，并确保后台刷写任务在运行"""
+        self._dirty_sessions.add(session_key)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def _flush_dirty_sessions(self) -> None:
+        """把所有脏会话批量写入存储"""
+        while self._dirty_sessions:
+            session_key = self._dirty_sessions.pop()
+            session = self._session_cache.get(session_key)
+            if session is not None:
+                self.storage.set(session_key, session)
+
+    async def _flush_loop(self) -> None:
+        """后台刷写循环：定期落盘脏会话，空闲时自动退出"""
+        try:
+            while self._dirty_sessions:
+                await asyncio.sleep(self._SESSION_FLUSH_INTERVAL)
+                self._flush_dirty_sessions()
+        finally:
+            self._flush_dirty_sessions()
+
     async def get_user_memory(self, user_id: str) -> Dict[str, Any]:
         """
         获取用户记忆
@@ -82,15 +186,19 @@ class QvQMemory:
             Dict[str, Any]: 用户记忆字典
         """
         key = self._get_user_memory_key(user_id)
-        memory = self.storage.get(
-            key,
-            {
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        # 默认字典仅在存储未命中时构造（命中时省去每次调用的字典分配和时间戳）
+        memory = self.storage.get(key, None)
+        if memory is None:
+            memory = {
                 "short_term": [],  # 短期记忆（最近对话）
                 "long_term": [],  # 长期记忆（重要信息）
                 "semantic": [],  # 语义记忆（关键概念）
-                "last_updated": datetime.now().isoformat(),
-            },
-        )
+                "last_updated": _now_iso(),
+            }
+        self._cache_put(key, memory)
         return memory
 
     async def set_user_memory(self, user_id: str, memory: Dict[str, Any]) -> None:
@@ -102,9 +210,9 @@ class QvQMemory:
             memory: 记忆字典
         """
         key = self._get_user_memory_key(user_id)
-        memory["last_updated"] = datetime.now().isoformat()
+        memory["last_updated"] = _now_iso()
+        self._cache_put(key, memory)
         self.storage.set(key, memory)
-        self._memory_cache[key] = memory
 
     async def get_group_memory(self, group_id: str) -> Dict[str, Any]:
         """
@@ -117,14 +225,18 @@ class QvQMemory:
             Dict[str, Any]: 群记忆字典
         """
         key = self._get_group_memory_key(group_id)
-        memory = self.storage.get(
-            key,
-            {
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        # 同上：默认字典延迟到未命中时再构造
+        memory = self.storage.get(key, None)
+        if memory is None:
+            memory = {
                 "sender_memory": {},  # 发送者记忆 {user_id: memory}
                 "shared_context": [],  # 群共享上下文
-                "last_updated": datetime.now().isoformat(),
-            },
-        )
+                "last_updated": _now_iso(),
+            }
+        self._cache_put(key, memory)
         return memory
 
     async def set_group_memory(self, group_id: str, memory: Dict[str, Any]) -> None:
@@ -136,9 +248,9 @@ class QvQMemory:
             memory: 记忆字典
         """
         key = self._get_group_memory_key(group_id)
-        memory["last_updated"] = datetime.now().isoformat()
+        memory["last_updated"] = _now_iso()
+        self._cache_put(key, memory)
         self.storage.set(key, memory)
-        self._memory_cache[key] = memory
 
     async def add_short_term_memory(
         self,
@@ -162,7 +274,7 @@ class QvQMemory:
         memory_key = self._get_session_key(
             user_id if not group_id else f"group:{group_id}"
         )
-        session = self.storage.get(memory_key, [])
+        session = self._get_session(memory_key)
 
         # 对于群聊，在消息中添加发送者信息以区分不同用户
         if group_id and role == "user":
@@ -170,14 +282,16 @@ class QvQMemory:
             content = f"【群友】{sender}: {content}"
 
         session.append(
-            {"role": role, "content": content, "timestamp": datetime.now().isoformat()}
+            {"role": role, "content": content, "timestamp": _now_iso()}
         )
 
         max_length = self.config.get("max_history_length", 20)
         if len(session) > max_length:
             session = session[-max_length:]
+            self._session_cache[memory_key] = session
 
-        self.storage.set(memory_key, session)
+        # 写合并：只更新内存并标记脏，由后台任务批量落盘
+        self._mark_session_dirty(memory_key)
 
     async def get_session_history(
         self, user_id: str, group_id: Optional[str] = None
@@ -196,7 +310,7 @@ class QvQMemory:
         session_key = self._get_session_key(
             user_id if not group_id else f"group:{group_id}"
         )
-        session = self.storage.get(session_key, [])
+        session = self._get_session(session_key)
         return [{"role": msg["role"], "content": msg["content"]} for msg in session]
 
     async def clear_session(self, user_id: str, group_id: Optional[str] = None) -> None:
@@ -211,6 +325,9 @@ class QvQMemory:
         session_key = self._get_session_key(
             user_id if not group_id else f"group:{group_id}"
         )
+        # 清空需立即落盘，避免被稍后的脏数据刷写覆盖
+        self._session_cache[session_key] = []
+        self._dirty_sessions.discard(session_key)
         self.storage.set(session_key, [])
 
     async def add_long_term_memory(
@@ -229,7 +346,7 @@ class QvQMemory:
         long_term_entry = {
             "content": content,
             "tags": tags or [],
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": _now_iso(),
             "importance": 1.0,
         }
 
@@ -241,8 +358,8 @@ class QvQMemory:
 
         await self.set_user_memory(user_id, memory)
 
-        # 检查是否需要压缩记忆
-        await self._check_and_compress_memory(user_id)
+        # 检查是否需要压缩记忆（复用已读取的记忆，避免重复回源）
+        await self._check_and_compress_memory(user_id, memory)
 
     async def add_group_memory(
         self, group_id: str, sender_id: str, content: str, is_context: bool = False
@@ -260,7 +377,7 @@ class QvQMemory:
 
         if is_context:
             memory["shared_context"].append(
-                {"content": content, "timestamp": datetime.now().isoformat()}
+                {"content": content, "timestamp": _now_iso()}
             )
             if len(memory["shared_context"]) > 20:
                 memory["shared_context"] = memory["shared_context"][-20:]
@@ -269,7 +386,7 @@ class QvQMemory:
                 memory["sender_memory"][sender_id] = []
 
             memory["sender_memory"][sender_id].append(
-                {"content": content, "timestamp": datetime.now().isoformat()}
+                {"content": content, "timestamp": _now_iso()}
             )
 
             if len(memory["sender_memory"][sender_id]) > 10:
@@ -294,11 +411,12 @@ class QvQMemory:
             List[Dict[str, Any]]: 搜索结果列表
         """
         results = []
+        query_lower = query.lower()
 
         # 搜索用户个人长期记忆
         user_memory = await self.get_user_memory(user_id)
         for entry in user_memory.get("long_term", []):
-            if query.lower() in entry["content"].lower():
+            if query_lower in entry["content"].lower():
                 results.append(
                     {
                         "source": "long_term",
@@ -314,7 +432,7 @@ class QvQMemory:
             # 只搜索发送者的群记忆，不搜索其他人的记忆
             if sender_memory := group_memory.get("sender_memory", {}).get(user_id, []):
                 for entry in sender_memory:
-                    if query.lower() in entry["content"].lower():
+                    if query_lower in entry["content"].lower():
                         results.append(
                             {
                                 "source": "group_sender",
@@ -325,7 +443,7 @@ class QvQMemory:
 
             # 搜索群公共上下文（所有用户共享）
             for entry in group_memory.get("shared_context", []):
-                if query.lower() in entry["content"].lower():
+                if query_lower in entry["content"].lower():
                     results.append(
                         {
                             "source": "group_context",
@@ -336,20 +454,24 @@ class QvQMemory:
 
         return results[:10]  # 返回最多10条结果
 
-    async def _check_and_compress_memory(self, user_id: str) -> None:
+    async def _check_and_compress_memory(
+        self, user_id: str, memory: Optional[Dict[str, Any]] = None
+    ) -> None:
         """
         检查并压缩记忆（如果记忆数量超过阈值）
 
         Args:
             user_id: 用户ID
+            memory: 已读取的记忆字典（可选，避免重复读取存储）
         """
         # 检查是否配置了压缩阈值
         compression_threshold = self.config.get("memory_compression_threshold", 0)
         if compression_threshold <= 0:
             return  # 未启用压缩功能
 
-        # 获取当前记忆
-        memory = await self.get_user_memory(user_id)
+        # 获取当前记忆（调用方已读取时直接复用）
+        if memory is None:
+            memory = await self.get_user_memory(user_id)
         long_term_count = len(memory.get("long_term", []))
 
         # 如果记忆数量超过阈值，进行压缩
@@ -361,25 +483,29 @@ class QvQMemory:
                     self.logger.info(
                         f"记忆数量({long_term_count})达到阈值({compression_threshold})，开始压缩用户 {user_id} 的记忆"
                     )
-                    result = await self.compress_memory(user_id, ai_client)
+                    result = await self.compress_memory(user_id, ai_client, memory)
                     self.logger.info(f"记忆压缩完成: {result}")
                 else:
                     self.logger.warning("记忆AI未配置，跳过记忆压缩")
             else:
                 self.logger.warning("AI管理器未初始化，跳过记忆压缩")
 
-    async def compress_memory(self, user_id: str, ai_client) -> str:
+    async def compress_memory(
+        self, user_id: str, ai_client, memory: Optional[Dict[str, Any]] = None
+    ) -> str:
         """
         压缩记忆
 
         Args:
             user_id: 用户ID
             ai_client: AI客户端
+            memory: 已读取的记忆字典（可选，避免重复读取存储）
 
         Returns:
             str: 压缩结果
         """
-        memory = await self.get_user_memory(user_id)
+        if memory is None:
+            memory = await self.get_user_memory(user_id)
 
         if not memory["long_term"]:
             return "没有需要压缩的记忆"
@@ -409,7 +535,7 @@ class QvQMemory:
                         if isinstance(entry, str)
                         else json.dumps(entry),
                         "tags": ["compressed"],
-                        "timestamp": datetime.now().isoformat(),
+                        "timestamp": _now_iso(),
                         "importance": 1.0,
                     }
                     for entry in (
@@ -424,7 +550,7 @@ class QvQMemory:
                     {
                         "content": response,
                         "tags": ["compressed"],
-                        "timestamp": datetime.now().isoformat(),
+                        "timestamp": _now_iso(),
                         "importance": 1.0,
                     }
                 ]
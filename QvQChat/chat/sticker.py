@@ -37,6 +37,8 @@ class StickerManager:
         self.logger = logger.get_child("StickerManager")
         self.storage = sdk.storage
         self._stickers: Dict[str, Dict[str, Any]] = {}
+        # 归一化名称索引：小写名称 -> 表情包（名称去重保证唯一）
+        self._name_index: Dict[str, Dict[str, Any]] = {}
         # 使用绝对路径，避免跨容器/CWD 不一致找不到文件
         self.sticker_dir = str(Path.cwd() / "data" / "QvQChat" / "stickers")
         self._load()
@@ -50,10 +52,22 @@ class StickerManager:
         """从存储加载表情包数据"""
         data = self.storage.get(self.STORAGE_KEY, {})
         self._stickers = data.get("stickers", {})
+        self._rebuild_name_index()
 
     def _save(self) -> None:
         """保存表情包数据到存储"""
         self.storage.set(self.STORAGE_KEY, {"stickers": self._stickers})
+        self._rebuild_name_index()
+
+    def _rebuild_name_index(self) -> None:
+        """重建归一化名称索引（表情包增删改时调用）"""
+        self._name_index = {
+            s.get("name", "").lower(): s for s in self._stickers.values()
+        }
+
+    def get_name_index(self) -> Dict[str, Dict[str, Any]]:
+        """获取归一化名称索引（小写名称 -> 表情包，调用方只读）"""
+        return self._name_index
 
     def list_stickers(self) -> List[Dict[str, Any]]:
         """列出所有表情包"""
@@ -112,7 +126,7 @@ class StickerManager:
         """确保名称唯一，重名时自动加 (2)/(3)..."""
         if not name:
             return name
-        existing = {s.get("name", "").lower() for s in self._stickers.values()}
+        existing = self._name_index
         if name.lower() not in existing:
             return name
         suffix = 2
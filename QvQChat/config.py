@@ -81,6 +81,7 @@ class QvQConfig:
                 "speed": 1.0,
                 "gain": 0.0,
                 "sample_rate": 44100,
+                "max_concurrent": 2,
                 "platforms": ["qq", "onebot11"],
             },
             "users": {},
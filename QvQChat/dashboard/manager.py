@@ -98,6 +98,10 @@ class DashboardManager:
     def sticker_manager(self):
         return self.core.sticker_manager
 
+    @property
+    def memory(self):
+        return self.core.memory
+
     # ==================== 注册/注销 ====================
 
     def register(self) -> None:
@@ -844,6 +848,9 @@ class DashboardManager:
                 "last_updated": "",
             },
         )
+        # 绕过QvQMemory直接写存储，需同步失效其读缓存，
+        # 否则TTL窗口内的记忆写入会把旧数据整体写回
+        self.memory.invalidate_cache(key)
         self.logger.info(f"已清除{mem_type}记忆: {user_id}")
         return {"ok": True}
 
@@ -897,6 +904,8 @@ class DashboardManager:
                     cleared += 1
                 except Exception:
                     pass
+        # 全量清空后整体失效读缓存（同 _api_delete_memory）
+        self.memory.invalidate_cache()
         self.logger.info(f"已清空全部记忆，共清理 {cleared} 条")
         return {"ok": True, "msg": f"已清空 {cleared} 条记忆"}
 
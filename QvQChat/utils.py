@@ -4,12 +4,51 @@ QvQChat 公共工具模块
 提供跨模块共享的工具函数。
 """
 
+import asyncio
+import base64
+import functools
+import os
 import re
+import tempfile
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiofiles
 
 from ErisPulse import sdk
+from ErisPulse.Core import logger as _core_logger
+
+# ==================== 预编译正则 ====================
+# 解析正则在模块加载时编译一次，避免每条消息重复编译
+
+# [img]...[/img] 和 [sticker]...[/sticker]
+_MEDIA_TAG_PATTERN = re.compile(
+    r'\[(?:img|sticker)\](.*?)\[/(?:img|sticker)\]',
+    re.IGNORECASE | re.DOTALL,
+)
+
+# 多消息分隔符 <|wait time="N"|>
+_WAIT_PATTERN = re.compile(
+    r"<\|\s*wait\s+time\s*=\s*[\"']?(\d+).*?\|?>", re.IGNORECASE
+)
+
+# 语音结束标签（标准格式，用于智能分割检测）
+_VOICE_END_PATTERN = re.compile(r"<\|\s*/\s*voice\s*\|>", re.IGNORECASE)
+
+# 语音开始标签前缀（判断结束标签后是否紧跟下一段语音）
+_VOICE_START_HINT = re.compile(r"<\|\s*voice\s+", re.IGNORECASE)
+
+# 语音开始/结束标签的统一交替正则（多种宽松格式，见 _parse_voice_tags_with_stack）
+# 开始/结束各自只差引号风格与结尾 |> / >，用 (?:"|') 与 \|?> 归并为各一条分支，
+# 一次 finditer 即可按顺序定位所有标签，通过 lastgroup 区分开始(start)与结束(end)
+# （嵌套命名组时 lastgroup 为最外层组名）
+_VOICE_TOKEN_RE = re.compile(
+    r'(?P<start><\|\s*voice\s+style\s*=\s*'
+    r'(?:"(?P<dq>[^"]*)"|\'(?P<sq>[^\']*)\')\s*\|?>)'
+    r"|(?P<end><(?:\|\s*/|/)\s*voice\s*\|?>)",
+    re.DOTALL,
+)
 
 
 def get_session_description(
@@ -72,16 +111,11 @@ def _extract_media_tags(text: str) -> tuple:
         tuple: (媒体URL列表, 移除标签后的纯文本)
     """
     urls = []
-    # 匹配 [img]...[/img] 和 [sticker]...[/sticker]
-    pattern = re.compile(
-        r'\[(?:img|sticker)\](.*?)\[/(?:img|sticker)\]',
-        re.IGNORECASE | re.DOTALL,
-    )
-    for match in pattern.finditer(text):
+    for match in _MEDIA_TAG_PATTERN.finditer(text):
         url = match.group(1).strip()
         if url:
             urls.append(url)
-    cleaned = pattern.sub('', text).strip()
+    cleaned = _MEDIA_TAG_PATTERN.sub('', text).strip()
     return urls, cleaned
 
 
@@ -101,14 +135,21 @@ def parse_multi_messages(text: str) -> List[Dict[str, Any]]:
     Returns:
         List[Dict[str, Any]]: 消息列表，每条消息包含content和delay
     """
+    # 先整体strip：这样单条消息路径返回的content与此处解析的字符串相等，
+    # 后续parse_speak_tags对同一条消息可直接命中解析缓存（每条消息只解析一次）
+    text = text.strip()
+
+    # 快速路径：没有任何标签前缀（语音/wait标签都含 <| 或 </）直接按单条消息返回，
+    # 纯文本回复（绝大多数情况）完全跳过正则扫描
+    if "<|" not in text and "</" not in text:
+        return [{"content": text, "delay": 0}]
+
     # 先解析所有语音标签的位置（使用栈来确保配对正确）
     voice_blocks = _parse_voice_tags_with_stack(text)
 
     # 检查是否有未关闭的语音标签
     if voice_blocks and voice_blocks[-1].get("is_unclosed", False):
-        from ErisPulse.Core import logger
-
-        logger.warning("未关闭的语音标签，按单条消息处理")
+        _core_logger.warning("未关闭的语音标签，按单条消息处理")
         return [{"content": text.strip(), "delay": 0}]
 
     # 步骤1: 按照 <|wait time="N"|> 分割消息，但跳过语音标签内部的分隔符
@@ -116,12 +157,8 @@ def parse_multi_messages(text: str) -> List[Dict[str, Any]]:
     current_start = 0
 
     # 找到所有的 wait 分隔符
-    wait_pattern = re.compile(
-        r"<\|\s*wait\s+time\s*=\s*[\"']?(\d+).*?\|?>", re.IGNORECASE
-    )
-
     has_wait_separator = False
-    for match in wait_pattern.finditer(text):
+    for match in _WAIT_PATTERN.finditer(text):
         match_pos = match.start()
 
         # 检查这个分隔符是否在任何语音标签内部
@@ -143,9 +180,8 @@ def parse_multi_messages(text: str) -> List[Dict[str, Any]]:
     # 如果没有找到分隔符，进行智能分割检测
     if not has_wait_separator:
         # 检查是否有 <|/voice|> 标签后跟文本的情况
-        voice_end_pattern = re.compile(r"<\|\s*/\s*voice\s*\|>", re.IGNORECASE)
         # 找所有的语音结束标签
-        for match in voice_end_pattern.finditer(text):
+        for match in _VOICE_END_PATTERN.finditer(text):
             voice_end_pos = match.end()
             # 检查语音标签后面是否有非空文本
             remaining_text = text[voice_end_pos:].strip()
@@ -156,9 +192,7 @@ def parse_multi_messages(text: str) -> List[Dict[str, Any]]:
             )
             if remaining_text and not is_inside_another_voice:
                 # 检查后面是否是下一个语音标签的开始
-                next_voice_start = re.search(
-                    r"<\|\s*voice\s+", remaining_text, re.IGNORECASE
-                )
+                next_voice_start = _VOICE_START_HINT.search(remaining_text)
                 if not next_voice_start or next_voice_start.start() > 0:
                     # 找到了需要分割的位置
                     part1 = text[:voice_end_pos].strip()
@@ -194,18 +228,21 @@ def parse_multi_messages(text: str) -> List[Dict[str, Any]]:
 
     # 最多返回3条消息
     if len(messages) > 3:
-        from ErisPulse.Core import logger
-
-        logger.warning("消息超过3条，只发送前3条")
+        _core_logger.warning("消息超过3条，只发送前3条")
         messages = messages[:3]
 
     return messages
 
 
-def _parse_voice_tags_with_stack(text: str) -> List[Dict[str, Any]]:
+@functools.lru_cache(maxsize=256)
+def _parse_voice_tags_with_stack(text: str) -> Tuple[Dict[str, Any], ...]:
     """
     使用栈解析所有语音标签
 
+    结果按文本内容做LRU缓存：同一段模型输出在发送管线中会被多次解析
+    （多消息分割、逐条语音提取），缓存后每段文本只解析一次。
+    返回元组且调用方不得修改其中的块字典。
+
     支持的错误格式：
     - <|voice style="开心"|>文本<|/voice|> （正确）
     - <|voice style="开心"|>文本<|/voice （少|）
@@ -216,79 +253,32 @@ def _parse_voice_tags_with_stack(text: str) -> List[Dict[str, Any]]:
         text: 包含语音标签的文本
 
     Returns:
-        List[Dict[str, Any]]: 语音块列表
+        Tuple[Dict[str, Any], ...]: 语音块元组
     """
+    # 快速路径：所有语音标签格式都含字面量 voice，不含则无需正则扫描
+    if "voice" not in text:
+        return ()
+
     voice_blocks = []
     stack = []  # 存储开启标签的位置和风格
 
-    # 放宽匹配规则 - 支持多种格式
-    # 格式1: <|voice style="..."|>
-    start_pattern1 = re.compile(r'<\|\s*voice\s+style\s*=\s*"([^"]*)"\s*\|>', re.DOTALL)
-    start_pattern2 = re.compile(r'<\|\s*voice\s+style\s*=\s*"([^"]*)"\s*>', re.DOTALL)
-    start_pattern3 = re.compile(
-        r"<\|\s*voice\s+style\s*=\s*\'([^\']*)\'\s*\|>", re.DOTALL
-    )
-    start_pattern4 = re.compile(
-        r"<\|\s*voice\s+style\s*=\s*\'([^\']*)\'\s*>", re.DOTALL
-    )
-
-    # 格式2: <|/voice|> 或 <|/voice> 或 </|voice|> 或 </|voice>
-    end_pattern1 = re.compile(r"<\|\s*/\s*voice\s*\|>", re.DOTALL)
-    end_pattern2 = re.compile(r"<\|\s*/\s*voice\s*>", re.DOTALL)
-    end_pattern3 = re.compile(r"</\s*voice\s*\|>", re.DOTALL)
-    end_pattern4 = re.compile(r"</\s*voice\s*>", re.DOTALL)
-
-    i = 0
-    while i < len(text):
-        # 查找下一个开始标签（尝试多种格式）
-        start_match1 = start_pattern1.search(text, i)
-        start_match2 = start_pattern2.search(text, i)
-        start_match3 = start_pattern3.search(text, i)
-        start_match4 = start_pattern4.search(text, i)
-
-        # 选择最早匹配的
-        start_match = min(
-            [m for m in [start_match1, start_match2, start_match3, start_match4] if m],
-            key=lambda m: m.start(),
-            default=None,
-        )
-
-        # 查找下一个结束标签（尝试多种格式）
-        end_match1 = end_pattern1.search(text, i)
-        end_match2 = end_pattern2.search(text, i)
-        end_match3 = end_pattern3.search(text, i)
-        end_match4 = end_pattern4.search(text, i)
-
-        # 选择最早匹配的
-        end_match = min(
-            [m for m in [end_match1, end_match2, end_match3, end_match4] if m],
-            key=lambda m: m.start(),
-            default=None,
-        )
-
-        if not start_match and not end_match:
-            break
-
-        if start_match and (not end_match or start_match.start() < end_match.start()):
-            # 找到开始标签
-            # 确定style值（不同格式）
-            for match in [start_match1, start_match2, start_match3, start_match4]:
-                if match and match.start() == start_match.start():
-                    style = match.group(1).strip()
-                    break
-            else:
-                style = ""
-
+    # 单趟扫描：交替正则按出现顺序依次产出开始/结束标签
+    for match in _VOICE_TOKEN_RE.finditer(text):
+        if match.lastgroup == "start":
+            # 找到开始标签（dq/sq 分别对应双引号/单引号风格值）
+            style_value = match.group("dq")
+            if style_value is None:
+                style_value = match.group("sq")
+            style = style_value.strip()
             stack.append(
                 {
-                    "start": start_match.start(),
-                    "end": start_match.end(),
+                    "start": match.start(),
+                    "end": match.end(),
                     "style": style,
-                    "content_start": start_match.end(),
+                    "content_start": match.end(),
                 }
             )
-            i = start_match.end()
-        elif end_match:
+        else:
             # 找到结束标签
             if stack:
                 # 与最近的开始标签配对
@@ -296,10 +286,10 @@ def _parse_voice_tags_with_stack(text: str) -> List[Dict[str, Any]]:
                 voice_blocks.append(
                     {
                         "start": start_block["start"],
-                        "end": end_match.end(),
+                        "end": match.end(),
                         "style": start_block["style"],
                         "content": text[
-                            start_block["content_start"] : end_match.start()
+                            start_block["content_start"] : match.start()
                         ].strip(),
                     }
                 )
@@ -308,13 +298,12 @@ def _parse_voice_tags_with_stack(text: str) -> List[Dict[str, Any]]:
                 # 没有匹配的开始标签，多余的结束标签
                 voice_blocks.append(
                     {
-                        "start": end_match.start(),
-                        "end": end_match.end(),
+                        "start": match.start(),
+                        "end": match.end(),
                         "style": "",
                         "content": "",
                     }
                 )
-            i = end_match.end()
 
     # 处理栈中未关闭的标签
     for block in stack:
@@ -328,7 +317,7 @@ def _parse_voice_tags_with_stack(text: str) -> List[Dict[str, Any]]:
             }
         )
 
-    return voice_blocks
+    return tuple(voice_blocks)
 
 
 def parse_speak_tags(text: str) -> Dict[str, Any]:
@@ -364,9 +353,7 @@ def parse_speak_tags(text: str) -> Dict[str, Any]:
 
         # 检查是否是未关闭的标签
         if first_voice.get("is_unclosed", False):
-            from ErisPulse.Core import logger
-
-            logger.warning("检测到未关闭的语音标签，使用标签后的所有内容作为语音")
+            _core_logger.warning("检测到未关闭的语音标签，使用标签后的所有内容作为语音")
 
         result["has_voice"] = True
         result["voice_style"] = first_voice["style"]
@@ -442,15 +429,14 @@ async def record_voice(
         resp = await sdk.client.post(api_url, json=data, headers=headers, timeout=30)
 
         # 获取临时文件夹
-        import tempfile
-
         temp_folder = tempfile.gettempdir()
         file_name = f"voice_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp3"
         speech_file_path = Path(temp_folder) / file_name
 
-        # 写入文件
-        with open(speech_file_path, "wb") as f:
-            f.write(resp.body if hasattr(resp, "body") else await resp.read())
+        # 异步写入文件（避免磁盘I/O阻塞事件循环）
+        voice_data = resp.body if hasattr(resp, "body") else await resp.read()
+        async with aiofiles.open(speech_file_path, "wb") as f:
+            await f.write(voice_data)
 
         logger.info(f"语音生成成功: {speech_file_path}")
         return str(speech_file_path)
@@ -493,6 +479,9 @@ class MessageSender:
         self.sdk_adapter = sdk_adapter
         self.config = config
         self.logger = logger
+        # 限制并发TTS请求数：多个会话同时触发语音时避免打爆语音API
+        max_concurrent = config.get("voice", {}).get("max_concurrent", 2)
+        self._tts_semaphore = asyncio.Semaphore(max_concurrent)
 
     async def send(
         self, platform: str, target_type: str, target_id: str, response: str
@@ -530,8 +519,6 @@ class MessageSender:
 
             # 延迟发送
             if delay > 0:
-                import asyncio
-
                 await asyncio.sleep(delay)
 
             await self._send_single_message(
@@ -633,10 +620,8 @@ class MessageSender:
         统一转为 bytes 发送（避免跨容器路径不通的问题）：
         - HTTP(S) URL：下载为 bytes
         - 本地文件路径：读取为 bytes
-        - base64:// 前缀：直接透传
+        - base64:// 前缀：本地解码为 bytes（免去适配器侧再解码）
         """
-        import os
-
         try:
             send_methods = sdk.adapter.list_sends(platform)
         except Exception:
@@ -649,7 +634,8 @@ class MessageSender:
         for url in urls:
             try:
                 if url.startswith("base64://"):
-                    await adapter.Send.To(target_type, target_id).Image(url)
+                    img_bytes = base64.b64decode(url[9:])
+                    await adapter.Send.To(target_type, target_id).Image(img_bytes)
                 elif url.startswith(("http://", "https://")):
                     resp = await sdk.client.get(url, timeout=30)
                     img_bytes = resp.content if hasattr(resp, "content") else resp.read()
@@ -696,38 +682,49 @@ class MessageSender:
             msg_index: 当前消息序号
             total_messages: 总消息数
         """
-        # 发送文本
-        if text:
+        async def _send_text_part() -> None:
+            if not text:
+                return
             await adapter.Send.To(target_type, target_id).Text(text)
             self.logger.info(
                 f"已发送文本到 {platform} - {target_type} - {target_id} "
                 f"(消息 {msg_index}/{total_messages})"
             )
 
-        # 发送语音
-        if voice_content and support_voice:
-            if voice_content.strip():
-                voice_file = await record_voice(
+        async def _record_voice_part() -> Optional[str]:
+            if not (voice_content and support_voice):
+                return None
+            if not voice_content.strip():
+                self.logger.warning("语音内容为空，跳过语音生成")
+                return None
+            # 并发TTS限流（见 __init__）
+            async with self._tts_semaphore:
+                return await record_voice(
                     voice_style, voice_content, self.config, self.logger
                 )
-                if voice_file:
-                    voice_path = Path(voice_file)
-                    if voice_path.exists():
-                        await self._send_voice_file(
-                            adapter,
-                            target_type,
-                            target_id,
-                            voice_file,
-                            platform,
-                            msg_index,
-                            total_messages,
-                        )
-                    else:
-                        self.logger.warning("语音文件不存在，跳过语音发送")
+
+        # 文本发送与语音合成互不依赖，并发执行把TTS耗时隐藏在文本发送之后；
+        # 语音文件仍在文本之后发送，消息顺序不变
+        _, voice_file = await asyncio.gather(_send_text_part(), _record_voice_part())
+
+        # 发送语音
+        if voice_content and support_voice and voice_content.strip():
+            if voice_file:
+                voice_path = Path(voice_file)
+                if voice_path.exists():
+                    await self._send_voice_file(
+                        adapter,
+                        target_type,
+                        target_id,
+                        voice_file,
+                        platform,
+                        msg_index,
+                        total_messages,
+                    )
                 else:
-                    self.logger.warning("语音生成失败，跳过语音发送")
+                    self.logger.warning("语音文件不存在，跳过语音发送")
             else:
-                self.logger.warning("语音内容为空，跳过语音生成")
+                self.logger.warning("语音生成失败，跳过语音发送")
         elif voice_content and not support_voice:
             self.logger.debug(f"平台 {platform} 不支持语音，跳过语音发送")
 
@@ -755,11 +752,12 @@ class MessageSender:
         """
         voice_path = Path(voice_file)
         voice_sent = False
+        voice_bytes = b""
 
-        # 方法1: 发送二进制数据
+        # 方法1: 发送二进制数据（异步读取，避免阻塞事件循环）
         try:
-            with open(voice_path, "rb") as f:
-                voice_bytes = f.read()
+            async with aiofiles.open(voice_path, "rb") as f:
+                voice_bytes = await f.read()
             await adapter.Send.To(target_type, target_id).Voice(voice_bytes)
             self.logger.info(
                 f"已发送语音到 {platform} - {target_type} - {target_id} "
@@ -779,4 +777,21 @@ class MessageSender:
                 )
                 voice_sent = True
             except Exception as file_err:
-                self.logger.warning(f"所有发送方式均失败: {file_err}")
+                self.logger.debug(f"文件路径发送失败: {file_err}")
+
+        # 方法3: base64:// 兜底（必须先b64encode再拼接，直接格式化bytes会损坏数据）
+        if not voice_sent:
+            try:
+                if not voice_bytes:
+                    async with aiofiles.open(voice_path, "rb") as f:
+                        voice_bytes = await f.read()
+                # b64encode大音频是纯CPU操作，放线程池避免阻塞事件循环
+                encoded = await asyncio.to_thread(base64.b64encode, voice_bytes)
+                voice_b64 = "base64://" + encoded.decode()
+                await adapter.Send.To(target_type, target_id).Voice(voice_b64)
+                self.logger.info(
+                    f"已发送语音(base64)到 {platform} - {target_type} - {target_id} "
+                    f"(消息 {msg_index}/{total_messages})"
+                )
+            except Exception as b64_err:
+                self.logger.warning(f"所有发送方式均失败: {b64_err}")